@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+import logging
+import os
+
+from pydantic import BaseModel
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+log = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")  # sem REDIS_URL o cache fica desligado
+
+# TTL por endpoint (segundos)
+SEARCH_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+STATS_TTL = int(os.getenv("STATS_CACHE_TTL", "120"))
+# cópia "stale" usada quando a OLX falha (stale-if-error)
+STALE_TTL = int(os.getenv("STALE_CACHE_TTL", "3600"))
+# resposta incompleta (alguma página da OLX falhou): vive pouco e não vira stale
+PARTIAL_TTL = int(os.getenv("PARTIAL_CACHE_TTL", "10"))
+
+M = TypeVar("M", bound=BaseModel)
+
+_redis: Optional[Redis] = None
+
+
+async def start_cache() -> None:
+    global _redis
+    if not REDIS_URL or _redis is not None:
+        return
+    pool = ConnectionPool.from_url(REDIS_URL, max_connections=20)
+    _redis = Redis(connection_pool=pool)
+
+
+async def close_cache() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        await _redis.connection_pool.disconnect()
+        _redis = None
+
+
+def get_redis() -> Optional[Redis]:
+    return _redis
+
+
+async def _safe_get(key: str) -> Optional[bytes]:
+    try:
+        return await _redis.get(key)
+    except RedisError as e:
+        log.warning("Erro lendo cache %s: %s", key, e)
+        return None
+
+
+async def cached(
+    key: str,
+    ttl: int,
+    model: Type[M],
+    producer: Callable[[], Awaitable[Tuple[M, bool]]],
+) -> M:
+    """
+    Cache-aside no Redis. producer() devolve (valor, parcial).
+    - hit: devolve o corpo salvo sem chamar a OLX.
+    - miss: chama producer(), grava com SETEX e devolve.
+    - valor parcial: grava só com PARTIAL_TTL e não substitui a cópia stale.
+    - se producer() levantar erro, devolve a última cópia salva (stale-if-error).
+    """
+    if _redis is None:
+        value, _ = await producer()
+        return value
+
+    hit = await _safe_get(key)
+    if hit is not None:
+        return model.model_validate_json(hit)
+
+    try:
+        value, partial = await producer()
+    except Exception:
+        stale = await _safe_get(f"stale:{key}")
+        if stale is None:
+            raise
+        log.warning("Servindo resposta stale para %s", key)
+        return model.model_validate_json(stale)
+
+    body = value.model_dump_json()
+    try:
+        async with _redis.pipeline(transaction=False) as pipe:
+            if partial:
+                pipe.setex(key, PARTIAL_TTL, body)
+            else:
+                pipe.setex(key, ttl, body)
+                pipe.setex(f"stale:{key}", STALE_TTL, body)
+            await pipe.execute()
+    except RedisError as e:
+        log.warning("Erro gravando cache %s: %s", key, e)
+
+    return value
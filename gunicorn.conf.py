@@ -0,0 +1,9 @@
+import os
+
+# Depois do async, cada worker atende muitas requisições em paralelo;
+# vários workers escalam isso quase linearmente entre os núcleos.
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+# Cada worker carrega numpy/numba + app (~175 MB de RSS): o padrão de 2 cabe
+# numa instância de 512 MB. Em máquinas maiores, suba via WEB_CONCURRENCY.
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "workers.UvloopWorker"
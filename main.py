@@ -1,16 +1,38 @@
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
+from arq import create_pool
+from arq.jobs import Job
 from fastapi.middleware.cors import CORSMiddleware
-from olx_client import search_olx, OlxListing
+from fastapi.responses import ORJSONResponse
+from olx_client import (
+    OlxFetchError,
+    OlxSearchResult,
+    close_client,
+    search_olx,
+    start_client,
+)
+from cache import cached, start_cache, close_cache, REDIS_URL, SEARCH_TTL, STATS_TTL
+from tasks import JOB_TIMEOUT, POLL_DELAY, REDIS_SETTINGS
+from price_stats import price_stats
+from models import Listing, SearchResponse, StatsResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Awaitable, Callable, Optional, Tuple, Type
+import asyncio
+import hmac
 import time
-import math
 import os
-import statistics
+
+import numpy as np
 
 API_KEY = os.getenv("API_KEY", "dev-key")  # <-- lê da env
 
-app = FastAPI(title="Fetcher API (mock)", version="0.1.0")
+# páginas da OLX buscadas em paralelo por requisição
+OLX_PAGES = int(os.getenv("OLX_PAGES", "2"))
+
+app = FastAPI(
+    title="Fetcher API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,78 +42,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class Listing(BaseModel):
-    id: str
-    title: str
-    url: str
-    modelo: Optional[str] = None
-    ano: Optional[int] = None
-    cidade: Optional[str] = None
-    preco: Optional[float] = None
-    km: Optional[int] = None
-    cambio: Optional[str] = None
-    combustivel: Optional[str] = None
-    data_coleta: Optional[float] = None
-    fonte: str = "olx"
-
-class SearchResponse(BaseModel):
-    items: List[Listing]
-    count: int
-    next_page: Optional[int] = None
+@app.on_event("startup")
+async def _startup():
+    # o cache sobe antes: o cliente HTTP usa o mesmo Redis
+    await start_cache()
+    await start_client()
+    # com Redis, a busca + parse roda nos workers ARQ (outro processo)
+    app.state.arq = await create_pool(REDIS_SETTINGS) if REDIS_URL else None
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await close_client()
+    await close_cache()
+    if app.state.arq is not None:
+        await app.state.arq.aclose()
+
+async def _check_api_key(x_api_key: str | None = Header(default=None)) -> None:
+    # compare_digest: comparação em tempo constante (sem timing side-channel)
+    if API_KEY and not hmac.compare_digest(
+        (x_api_key or "").encode(), API_KEY.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
-class StatsResponse(BaseModel):
-    n: int
-    media: Optional[float] = None
-    mediana: Optional[float] = None
-    p25: Optional[float] = None
-    p75: Optional[float] = None
-    updated_at: float
+async def _fetch_listings(
+    modelo: str,
+    ano: Optional[int],
+    cidade: Optional[str],
+    max_price: Optional[float],
+    max_items: int,
+    pages: int = OLX_PAGES,
+) -> OlxSearchResult:
+    """
+    Despacha a busca para a fila ARQ e espera o resultado até JOB_TIMEOUT.
+    Sem Redis configurado, roda search_olx no próprio processo.
+    Buscas idênticas simultâneas compartilham o mesmo job (mesmo _job_id).
+    Em timeout a exceção sobe e o cache serve a última resposta (stale).
+    """
+    pool = app.state.arq
+    if pool is None:
+        return await search_olx(
+            modelo=modelo,
+            ano=ano,
+            cidade=cidade,
+            max_price=max_price,
+            max_items=max_items,
+            pages=pages,
+        )
 
-def _check_api_key(x_api_key: str | None):
-    if API_KEY and x_api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    job_id = f"olx:{modelo}:{ano}:{cidade}:{max_price}:{max_items}:{pages}"
+    job = await pool.enqueue_job(
+        "fetch_olx_task",
+        modelo,
+        ano,
+        cidade,
+        max_price,
+        max_items,
+        pages,
+        _job_id=job_id,
+    )
+    if job is None:
+        # já existe um job com esse id (na fila ou com resultado guardado)
+        job = Job(job_id, pool)
+    return await job.result(timeout=JOB_TIMEOUT, poll_delay=POLL_DELAY)
+
+async def _serve(
+    key: str,
+    ttl: int,
+    model: Type[BaseModel],
+    producer: Callable[[], Awaitable[Tuple[BaseModel, bool]]],
+) -> BaseModel:
+    # falha da OLX (ou do worker) sem cópia stale no cache vira 502/504
+    try:
+        return await cached(key, ttl, model, producer)
+    except OlxFetchError as e:
+        raise HTTPException(status_code=502, detail="OLX indisponível") from e
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail="Busca na OLX demorou demais") from e
 
 @app.get("/health")
 def health():
     return {"status": "ok", "ts": time.time()}
 
-@app.get("/stats", response_model=StatsResponse)
-def stats(
+async def _search_response(
     modelo: str,
-    ano: int | None = None,
-    cidade: str | None = None,
-    x_api_key: str | None = Header(default=None),
-):
-    _check_api_key(x_api_key)
-    base = 55000 if ano is None else max(35000, 60000 - (2025 - (ano or 2020)) * 2000)
-    return StatsResponse(
-        n=62,
-        media=base,
-        mediana=base * 0.98,
-        p25=base * 0.93,
-        p75=base * 1.05,
-        updated_at=time.time(),
-    )
-
-@app.get("/search", response_model=SearchResponse)
-def search(
-    modelo: str,
-    ano: int | None = None,
-    cidade: str | None = None,
-    max_price: float | None = None,
-    page: int = 1,
-    x_api_key: str | None = Header(default=None),
-):
-    _check_api_key(x_api_key)
-
-    # Por enquanto, trazemos max 80 itens da primeira página
-    raw_listings: List[OlxListing] = search_olx(
+    ano: Optional[int],
+    cidade: Optional[str],
+    max_price: Optional[float],
+    page: int,
+) -> Tuple[SearchResponse, bool]:
+    # Trazemos no máximo 80 itens das primeiras OLX_PAGES páginas
+    result = await _fetch_listings(
         modelo=modelo,
         ano=ano,
         cidade=cidade,
         max_price=max_price,
         max_items=80,
     )
+    raw_listings = result.listings
 
     # Se quiser fazer paginação "fake" do lado do servidor:
     page_size = 20
@@ -99,45 +146,44 @@ def search(
     end = start + page_size
     page_items = raw_listings[start:end]
 
-    # Converte OlxListing -> seu modelo Listing (Pydantic)
-    items = [
-        Listing(
-            id=l.id,
-            title=l.title,
-            url=l.url,
-            modelo=l.modelo,
-            ano=l.ano,
-            cidade=l.cidade,
-            preco=l.preco,
-            km=l.km,
-            cambio=l.cambio,
-            combustivel=l.combustivel,
-            data_coleta=l.data_coleta,
-            fonte=l.fonte,
-        )
-        for l in page_items
-    ]
+    # Converte OlxListing -> seu modelo Listing (Pydantic), lendo os
+    # atributos do dataclass direto (from_attributes), sem montar dict
+    items = [Listing.model_validate(l) for l in page_items]
 
     next_page: Optional[int] = None
     if end < len(raw_listings):
         next_page = page + 1
 
-    return SearchResponse(
+    response = SearchResponse(
         items=items,
         count=len(raw_listings),
         next_page=next_page,
     )
+    return response, result.partial
 
-@app.get("/stats", response_model=StatsResponse)
-def stats(
+@app.get("/search", response_model=SearchResponse)
+async def search(
     modelo: str,
     ano: int | None = None,
     cidade: str | None = None,
-    x_api_key: str | None = Header(default=None),
+    max_price: float | None = None,
+    page: int = 1,
+    _: None = Depends(_check_api_key),
 ):
-    _check_api_key(x_api_key)
+    key = f"search:{modelo}:{ano}:{cidade}:{max_price}:{page}"
+    return await _serve(
+        key,
+        SEARCH_TTL,
+        SearchResponse,
+        lambda: _search_response(modelo, ano, cidade, max_price, page),
+    )
 
-    listings: List[OlxListing] = search_olx(
+async def _stats_response(
+    modelo: str,
+    ano: Optional[int],
+    cidade: Optional[str],
+) -> Tuple[StatsResponse, bool]:
+    result = await _fetch_listings(
         modelo=modelo,
         ano=ano,
         cidade=cidade,
@@ -145,10 +191,13 @@ def stats(
         max_items=80,
     )
 
-    prices = [l.preco for l in listings if l.preco is not None]
+    prices = np.fromiter(
+        (l.preco for l in result.listings if l.preco is not None),
+        dtype=np.float64,
+    )
 
-    if not prices:
-        return StatsResponse(
+    if prices.size == 0:
+        empty = StatsResponse(
             n=0,
             media=None,
             mediana=None,
@@ -156,27 +205,12 @@ def stats(
             p75=None,
             updated_at=time.time(),
         )
+        return empty, result.partial
+
+    n = int(prices.size)
+    media, mediana, p25, p75 = price_stats(prices)
 
-    prices_sorted = sorted(prices)
-    n = len(prices_sorted)
-    media = float(statistics.mean(prices_sorted))
-    mediana = float(statistics.median(prices_sorted))
-
-    def percentile(p: float) -> float:
-        # p de 0 a 1
-        k = (len(prices_sorted) - 1) * p
-        f = math.floor(k)
-        c = math.ceil(k)
-        if f == c:
-            return float(prices_sorted[int(k)])
-        d0 = prices_sorted[int(f)] * (c - k)
-        d1 = prices_sorted[int(c)] * (k - f)
-        return float(d0 + d1)
-
-    p25 = percentile(0.25)
-    p75 = percentile(0.75)
-
-    return StatsResponse(
+    response = StatsResponse(
         n=n,
         media=media,
         mediana=mediana,
@@ -184,3 +218,16 @@ def stats(
         p75=p75,
         updated_at=time.time(),
     )
+    return response, result.partial
+
+@app.get("/stats", response_model=StatsResponse)
+async def stats(
+    modelo: str,
+    ano: int | None = None,
+    cidade: str | None = None,
+    _: None = Depends(_check_api_key),
+):
+    key = f"stats:{modelo}:{ano}:{cidade}"
+    return await _serve(
+        key, STATS_TTL, StatsResponse, lambda: _stats_response(modelo, ano, cidade)
+    )
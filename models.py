@@ -0,0 +1,31 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+
+class Listing(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    title: str
+    url: str
+    modelo: Optional[str] = None
+    ano: Optional[int] = None
+    cidade: Optional[str] = None
+    preco: Optional[float] = None
+    km: Optional[int] = None
+    cambio: Optional[str] = None
+    combustivel: Optional[str] = None
+    data_coleta: Optional[float] = None
+    fonte: str = "olx"
+
+class SearchResponse(BaseModel):
+    items: List[Listing]
+    count: int
+    next_page: Optional[int] = None
+
+class StatsResponse(BaseModel):
+    n: int
+    media: Optional[float] = None
+    mediana: Optional[float] = None
+    p25: Optional[float] = None
+    p75: Optional[float] = None
+    updated_at: float
@@ -1,19 +1,125 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Optional
+import asyncio
 import re
 import logging
+import os
 import time
-from urllib.parse import quote_plus
+from urllib.parse import urlencode
 
-import requests
-from bs4 import BeautifulSoup 
+import hishel
+import httpx
+from redis.exceptions import RedisError
+from selectolax.parser import HTMLParser
+
+from cache import get_redis
 
 log = logging.getLogger(__name__)
 
 BASE_URL = "https://www.olx.com.br"
+# caminho genérico para carros
+_PATH = "/autos-e-pecas/carros-vans-e-utilitarios"
+_BASE_PATH = BASE_URL + _PATH
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0 Safari/537.36"
+    ),
+    "Accept-Language": "pt-BR,pt;q=0.9",
+    "Accept-Encoding": "gzip, br",
+}
+
+_PRICE_RE = re.compile(r"(\d+(?:\.\d+)?)")
+_KM_RE = re.compile(r"(\d[\d\.]*)\s*km")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_CHIP_RE = re.compile(
+    r"(?P<km>\d[\d\.]*\s*km)"
+    r"|(?P<cam>manual|autom[aá]tic[ao])"
+    r"|(?P<comb>flex|gasolina|diesel|[áa]lcool|etanol)",
+    re.I,
+)
+
+# remove acentos e troca espaço por hífen numa única passada
+_ACCENT_TABLE = str.maketrans("áãâéêíóôõúç ", "aaaeeiooouc-")
+
+# teto de requisições simultâneas à OLX no processo inteiro (todas as buscas).
+# Por padrão igual ao pool do cliente HTTP, para não enfileirar buscas além
+# do que o pool já permite; baixe via env se a OLX começar a limitar (429).
+MAX_CONCURRENT_PAGES = int(os.getenv("OLX_MAX_CONCURRENCY", "100"))
+_OLX_SEM = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+
+# cache HTTP (ETag / Last-Modified / Cache-Control) abaixo do cache de respostas
+HTTP_CACHE_TTL = 300
+
+class OlxFetchError(Exception):
+    """A OLX não pôde ser lida (erro de rede ou status != 200)."""
+
+
+# Cliente HTTP compartilhado (keep-alive + HTTP/2); criado no startup da API
+_client: Optional[httpx.AsyncClient] = None
+# Cliente sem cache HTTP, usado quando o Redis do hishel falha
+_plain_client: Optional[httpx.AsyncClient] = None
+
+_CLIENT_KWARGS = dict(
+    http2=True,
+    timeout=15,
+    limits=httpx.Limits(
+        max_connections=MAX_CONCURRENT_PAGES, max_keepalive_connections=50
+    ),
+    headers=HEADERS,
+)
+
+
+def _new_client() -> httpx.AsyncClient:
+    redis = get_redis()
+    if redis is not None:
+        storage = hishel.AsyncRedisStorage(client=redis, ttl=HTTP_CACHE_TTL)
+    else:
+        storage = hishel.AsyncInMemoryStorage(ttl=HTTP_CACHE_TTL)
+
+    return hishel.AsyncCacheClient(
+        storage=storage,
+        controller=hishel.Controller(cacheable_methods=["GET"], allow_stale=True),
+        **_CLIENT_KWARGS,
+    )
+
+
+async def start_client() -> None:
+    global _client
+    if _client is None:
+        _client = _new_client()
+
+
+async def close_client() -> None:
+    global _client, _plain_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _plain_client is not None:
+        await _plain_client.aclose()
+        _plain_client = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    # fallback para uso fora da API (scripts, testes), sem passar pelo startup
+    global _client
+    if _client is None:
+        _client = _new_client()
+    return _client
+
 
-@dataclass
+def _get_plain_client() -> httpx.AsyncClient:
+    # criado só na primeira falha do Redis
+    global _plain_client
+    if _plain_client is None:
+        _plain_client = httpx.AsyncClient(**_CLIENT_KWARGS)
+    return _plain_client
+
+@dataclass(slots=True, frozen=True)
 class OlxListing:
     id: str
     title: str
@@ -26,44 +132,26 @@ class OlxListing:
     cambio: Optional[str]
     combustivel: Optional[str]
     fonte: str = "olx"
-    data_coleta: float = time.time()
+    # default_factory: o horário é o da coleta, não o do import do módulo
+    data_coleta: float = field(default_factory=time.time)
 
 
+@lru_cache(maxsize=1024)
 def _slugify_city(cidade: str | None) -> str | None:
     if not cidade:
         return None
-    return (
-        cidade.lower()
-        .strip()
-        .replace(" ", "-")
-        .replace("á", "a")
-        .replace("ã", "a")
-        .replace("â", "a")
-        .replace("é", "e")
-        .replace("ê", "e")
-        .replace("í", "i")
-        .replace("ó", "o")
-        .replace("ô", "o")
-        .replace("õ", "o")
-        .replace("ú", "u")
-        .replace("ç", "c")
-    )
+    return cidade.lower().strip().translate(_ACCENT_TABLE)
 
 
+# função pura: a mesma (modelo, ano, cidade) se repete entre páginas
+@lru_cache(maxsize=2048)
 def _build_search_url(modelo: str, ano: Optional[int] = None, cidade: Optional[str] = None) -> str:
     """
     Monta uma URL de busca da OLX para carros.
     Aqui usamos uma URL genérica com o parâmetro q (texto livre).
     Se quiser ficar mais específico por estado/região, pode adaptar depois.
     """
-    query_parts = [modelo]
-    if ano:
-        query_parts.append(str(ano))
-
-    q = quote_plus(" ".join(query_parts))
-
-    # caminho genérico para carros
-    path = "/autos-e-pecas/carros-vans-e-utilitarios"
+    q = f"{modelo} {ano}" if ano else modelo
 
     # cidade ainda não está sendo usada no path; você pode refinar isso depois
     city_slug = _slugify_city(cidade)
@@ -73,8 +161,7 @@ def _build_search_url(modelo: str, ano: Optional[int] = None, cidade: Optional[s
         # mas isso varia de estado pra estado; começamos simples
         pass
 
-    url = f"{BASE_URL}{path}?q={q}"
-    return url
+    return f"{_BASE_PATH}?{urlencode((('q', q),))}"
 
 
 def _parse_price(text: str | None) -> Optional[float]:
@@ -82,7 +169,7 @@ def _parse_price(text: str | None) -> Optional[float]:
         return None
     txt = text.replace("R$", "").replace(".", "").replace(" ", "").strip()
     txt = txt.replace(",", ".")
-    m = re.search(r"(\d+(\.\d+)?)", txt)
+    m = _PRICE_RE.search(txt)
     if not m:
         return None
     try:
@@ -95,7 +182,7 @@ def _parse_km(text: str | None) -> Optional[int]:
     if not text:
         return None
     # algo tipo "73.000 km"
-    m = re.search(r"(\d[\d\.]*)\s*km", text.lower())
+    m = _KM_RE.search(text.lower())
     if not m:
         return None
     val = m.group(1).replace(".", "")
@@ -108,7 +195,7 @@ def _parse_km(text: str | None) -> Optional[int]:
 def _parse_year_from_title(title: str | None) -> Optional[int]:
     if not title:
         return None
-    m = re.search(r"\b(19|20)\d{2}\b", title)
+    m = _YEAR_RE.search(title)
     if not m:
         return None
     try:
@@ -117,102 +204,173 @@ def _parse_year_from_title(title: str | None) -> Optional[int]:
         return None
 
 
-def search_olx(
+@dataclass(slots=True, frozen=True)
+class OlxSearchResult:
+    listings: List[OlxListing]
+    # alguma página além da 1ª falhou: resultado incompleto
+    partial: bool = False
+
+
+async def _read_page(client: httpx.AsyncClient, url: str) -> bytes:
+    try:
+        # lê o corpo direto em bytes (já descomprimido pelo httpx),
+        # sem materializar resp.text nem detectar encoding
+        async with client.stream("GET", url) as resp:
+            if resp.status_code != 200:
+                raise OlxFetchError(f"OLX respondeu {resp.status_code} para {url}")
+            return await resp.aread()
+    except httpx.HTTPError as e:
+        raise OlxFetchError(f"Erro de rede acessando OLX: {e}") from e
+
+
+async def _fetch_page(url: str) -> bytes:
+    async with _OLX_SEM:
+        log.info("Buscando OLX: %s", url)
+        try:
+            return await _read_page(_get_client(), url)
+        except RedisError as e:
+            # cache HTTP fora do ar não derruba a busca: vira um miss sem cache
+            log.warning("Erro no cache HTTP (%s), buscando sem cache: %s", url, e)
+            return await _read_page(_get_plain_client(), url)
+
+
+async def search_olx(
     modelo: str,
     ano: Optional[int] = None,
     cidade: Optional[str] = None,
     max_price: Optional[float] = None,
     max_items: int = 50,
-) -> List[OlxListing]:
+    pages: int = 1,
+) -> OlxSearchResult:
     """
-    Busca simples na página de resultados da OLX.
-    - Faz 1 requisição HTTP à página de busca.
+    Busca simples nas páginas de resultados da OLX.
+    - Faz `pages` requisições HTTP concorrentes (páginas 1..pages da busca).
     - Lê os cards de anúncio (section.olx-adcard).
     - Extrai título, preço, localização, km, etc.
     - Filtra por max_price se fornecido.
-    - Limita a max_items resultados.
+    - Remove anúncios repetidos entre páginas e limita a max_items resultados.
+    Levanta OlxFetchError se a página 1 não pôde ser lida, para que o cache
+    não guarde falha da OLX como resposta. Falhas nas páginas seguintes só
+    marcam o resultado como `partial`.
     """
     url = _build_search_url(modelo, ano=ano, cidade=cidade)
-    log.info("Buscando OLX: %s", url)
+    urls = [url] + [f"{url}&o={p}" for p in range(2, pages + 1)]
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0 Safari/537.36"
-        ),
-        "Accept-Language": "pt-BR,pt;q=0.9",
-    }
+    responses = await asyncio.gather(
+        *(_fetch_page(u) for u in urls), return_exceptions=True
+    )
+    first = responses[0]
+    if isinstance(first, BaseException):
+        raise first
+
+    bodies: List[bytes] = [first]
+    for u, r in zip(urls[1:], responses[1:]):
+        if isinstance(r, BaseException):
+            log.warning("Falha buscando OLX (%s): %s", u, r)
+        else:
+            bodies.append(r)
+
+    # parse é CPU-bound: roda numa thread para não travar o event loop
+    listings = await asyncio.to_thread(
+        _parse_pages,
+        bodies,
+        modelo,
+        ano,
+        cidade,
+        max_price,
+        max_items,
+    )
+    return OlxSearchResult(listings=listings, partial=len(bodies) < len(urls))
 
-    try:
-        resp = requests.get(url, headers=headers, timeout=15)
-    except Exception as e:
-        log.exception("Erro de rede acessando OLX: %s", e)
-        return []
 
-    if resp.status_code != 200:
-        log.warning("OLX respondeu %s para %s", resp.status_code, url)
-        return []
+def _parse_pages(
+    bodies: List[bytes],
+    modelo: str,
+    ano: Optional[int],
+    cidade: Optional[str],
+    max_price: Optional[float],
+    max_items: int,
+) -> List[OlxListing]:
+    seen: set[str] = set()
+    results: List[OlxListing] = []
+
+    for body in bodies:
+        for listing in _parse_cards(body, modelo, ano, cidade, max_price, max_items):
+            if listing.id in seen:
+                continue
+            seen.add(listing.id)
+            results.append(listing)
+            if len(results) >= max_items:
+                return results
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    return results
+
+
+def _parse_cards(
+    html: bytes,
+    modelo: str,
+    ano: Optional[int],
+    cidade: Optional[str],
+    max_price: Optional[float],
+    max_items: int,
+) -> List[OlxListing]:
+    # selectolax (Lexbor, em C): parse e seletores CSS fora do Python
+    tree = HTMLParser(html)
 
     # Cards de anúncio
-    cards = soup.select("section.olx-adcard")
+    cards = tree.css("section.olx-adcard")
     results: List[OlxListing] = []
 
     for card in cards:
         try:
             # Título
-            title_el = card.select_one("h2.olx-adcard__title")
-            title = (title_el.get_text(strip=True) if title_el else "").strip()
+            title_el = card.css_first("h2.olx-adcard__title")
+            title = (title_el.text(strip=True) if title_el else "").strip()
 
             # Link
-            link_el = card.select_one("a.olx-adcard__link")
+            link_el = card.css_first("a.olx-adcard__link")
             url_rel = (
-                link_el["href"]
-                if link_el is not None and link_el.has_attr("href")
-                else ""
-            )
+                link_el.attributes.get("href") if link_el is not None else None
+            ) or ""
             if url_rel.startswith("/"):
                 url_full = BASE_URL + url_rel
             else:
                 url_full = url_rel
 
             # ID (se a OLX expor data-id em outro nível, você pode usar; aqui usamos a URL)
-            ad_id = card.get("data-id") or url_full
+            ad_id = card.attributes.get("data-id") or url_full
 
             # Preço
-            price_el = card.select_one("h3.olx-adcard__price")
-            preco = _parse_price(price_el.get_text(strip=True) if price_el else None)
+            price_el = card.css_first("h3.olx-adcard__price")
+            preco = _parse_price(price_el.text(strip=True) if price_el else None)
 
             # Localização / cidade
-            loc_el = card.select_one("p.olx-adcard__location")
+            loc_el = card.css_first("p.olx-adcard__location")
             cidade_txt: Optional[str] = None
             if loc_el:
-                raw_loc = loc_el.get_text(" ", strip=True)  # "Aracaju, São Conrado"
+                raw_loc = loc_el.text(separator=" ", strip=True)  # "Aracaju, São Conrado"
                 cidade_txt = raw_loc.split(",")[0].strip() if raw_loc else None
 
             # Ano (se não veio por parâmetro já filtrando, tenta inferir do título)
             year = ano or _parse_year_from_title(title)
 
             # Detalhes (km, câmbio, combustível, etc.)
-            detail_elems = card.select("div.olx-adcard__detail")
-            chips = [d.get_text(" ", strip=True).lower() for d in detail_elems]
+            detail_elems = card.css("div.olx-adcard__detail")
+            chips = [d.text(separator=" ", strip=True).lower() for d in detail_elems]
 
             km_val: Optional[int] = None
             cambio: Optional[str] = None
             combustivel: Optional[str] = None
 
-            for chip in chips:
-                if "km" in chip:
-                    km_val = _parse_km(chip)
-                elif "manual" in chip or "automático" in chip or "automatica" in chip:
-                    cambio = chip
-                elif any(
-                    x in chip
-                    for x in ["flex", "gasolina", "diesel", "álcool", "alcool", "etanol"]
-                ):
-                    combustivel = chip
+            # uma passada do regex sobre os chips juntos; fica o 1º de cada tipo
+            for m in _CHIP_RE.finditer(" | ".join(chips)):
+                kind = m.lastgroup
+                if kind == "km" and km_val is None:
+                    km_val = _parse_km(m.group())
+                elif kind == "cam" and cambio is None:
+                    cambio = m.group()
+                elif kind == "comb" and combustivel is None:
+                    combustivel = m.group()
 
             listing = OlxListing(
                 id=str(ad_id),
@@ -241,5 +399,3 @@ def search_olx(
             continue
 
     return results
-
-    
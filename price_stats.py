@@ -0,0 +1,40 @@
+from __future__ import annotations
+from typing import Tuple
+import math
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _quantile(a: np.ndarray, q: float) -> float:
+    # a já ordenado; interpolação linear entre os vizinhos (q de 0 a 1)
+    k = (a.shape[0] - 1) * q
+    f = math.floor(k)
+    c = math.ceil(k)
+    if f == c:
+        return a[int(k)]
+    return a[int(f)] * (c - k) + a[int(c)] * (k - f)
+
+
+@njit(cache=True, fastmath=True)
+def _stats_kernel(prices: np.ndarray) -> Tuple[float, float, float, float]:
+    """
+    Recebe os preços (float64, qualquer ordem) e devolve
+    (media, mediana, p25, p75) numa única passada sobre uma cópia ordenada.
+    """
+    a = np.sort(prices)
+    n = a.shape[0]
+    total = 0.0
+    for i in range(n):
+        total += a[i]
+    return total / n, _quantile(a, 0.5), _quantile(a, 0.25), _quantile(a, 0.75)
+
+
+def price_stats(prices: np.ndarray) -> Tuple[float, float, float, float]:
+    media, mediana, p25, p75 = _stats_kernel(prices)
+    return float(media), float(mediana), float(p25), float(p75)
+
+
+# compila na importação para o primeiro request não pagar o JIT
+_stats_kernel(np.zeros(4, dtype=np.float64))
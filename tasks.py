@@ -0,0 +1,60 @@
+from __future__ import annotations
+from typing import Optional
+import os
+
+from arq.connections import RedisSettings
+
+from cache import close_cache, start_cache
+from olx_client import OlxSearchResult, close_client, search_olx, start_client
+
+# fila ARQ: mesma instância Redis do cache
+REDIS_SETTINGS = RedisSettings.from_dsn(os.getenv("REDIS_URL", "redis://localhost:6379"))
+
+# quanto o endpoint espera pelo worker antes de desistir (segundos)
+JOB_TIMEOUT = float(os.getenv("OLX_JOB_TIMEOUT", "10"))
+# intervalo de polling (API esperando o resultado e worker lendo a fila)
+POLL_DELAY = 0.05
+# o resultado só precisa viver até os requests esperando o job lerem; o cache
+# de respostas guarda o sucesso. Curto também porque o ARQ guarda falhas pelo
+# mesmo tempo, e quem pegar o mesmo _job_id nesse intervalo recebe o erro.
+KEEP_RESULT = 2
+
+
+async def fetch_olx_task(
+    ctx: dict,
+    modelo: str,
+    ano: Optional[int],
+    cidade: Optional[str],
+    max_price: Optional[float],
+    max_items: int,
+    pages: int = 1,
+) -> OlxSearchResult:
+    return await search_olx(
+        modelo=modelo,
+        ano=ano,
+        cidade=cidade,
+        max_price=max_price,
+        max_items=max_items,
+        pages=pages,
+    )
+
+
+async def _startup(ctx: dict) -> None:
+    await start_cache()
+    await start_client()
+
+
+async def _shutdown(ctx: dict) -> None:
+    await close_client()
+    await close_cache()
+
+
+class WorkerSettings:
+    """Worker ARQ: `arq tasks.WorkerSettings`."""
+
+    functions = [fetch_olx_task]
+    on_startup = _startup
+    on_shutdown = _shutdown
+    redis_settings = REDIS_SETTINGS
+    poll_delay = POLL_DELAY
+    keep_result = KEEP_RESULT
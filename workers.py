@@ -0,0 +1,7 @@
+from uvicorn_worker import UvicornWorker
+
+
+class UvloopWorker(UvicornWorker):
+    """Worker uvicorn com loop libuv (uvloop) e parser HTTP em C (httptools)."""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}